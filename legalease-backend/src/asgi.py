@@ -0,0 +1,199 @@
+"""
+ASGI entry point for production serving.
+
+Run from the legalease-backend directory with:
+    uvicorn src.asgi:asgi_app --host 0.0.0.0 --port 5000
+
+Keep to one worker process: documents, workspaces and chat turn counters are
+held in process memory.
+
+Async Flask views are awaited directly on the server's event loop, so in-flight
+Gemini calls don't hold a thread each. Sync views still go through the WSGI app,
+in a thread pool sized by ASGI_SYNC_WORKERS.
+"""
+import asyncio
+import inspect
+import io
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from flask import request, request_started
+from werkzeug.exceptions import HTTPException
+
+from src.main import app
+from src.services.extraction import extraction_service
+from src.services.executor import ASGI_ENVIRON_KEY
+
+ASGI_SYNC_WORKERS = int(os.environ.get('ASGI_SYNC_WORKERS', 64))
+
+
+def build_environ(scope, body):
+    """Build a WSGI environ from an ASGI HTTP scope and the full request body"""
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': (scope.get('client') or ('', 0))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+        ASGI_ENVIRON_KEY: True,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE' or name == 'CONTENT_LENGTH':
+            key = name
+        else:
+            key = f'HTTP_{name}'
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+class FlaskASGI:
+    """Serve a Flask app over ASGI, running async views natively on the event loop"""
+
+    def __init__(self, flask_app, sync_workers=ASGI_SYNC_WORKERS):
+        self.app = flask_app
+        self.sync_workers = sync_workers
+        self._executor = ThreadPoolExecutor(max_workers=sync_workers, thread_name_prefix='legalease-wsgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        else:
+            raise RuntimeError(f"Unsupported ASGI scope type: {scope['type']}")
+
+    async def _lifespan(self, receive, send):
+        loop = asyncio.get_running_loop()
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                # Start extraction workers now so the first upload doesn't wait on process startup
+                try:
+                    await loop.run_in_executor(None, extraction_service.start)
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': f"Extraction workers failed to start: {e}"})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                extraction_service.shutdown()
+                self._executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope, receive, send):
+        limit = self.app.config.get('MAX_CONTENT_LENGTH')
+        declared_length = dict(scope.get('headers', [])).get(b'content-length')
+        if limit and declared_length and declared_length.isdigit() and int(declared_length) > limit:
+            await self._send_too_large(send)
+            return
+
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body.extend(message.get('body', b''))
+            if limit and len(body) > limit:
+                await self._send_too_large(send)
+                return
+            if not message.get('more_body'):
+                break
+
+        environ = build_environ(scope, bytes(body))
+        view = self._async_view(environ)
+        if view is not None:
+            status, headers, chunks = await self._dispatch_async(environ, view)
+        else:
+            loop = asyncio.get_running_loop()
+            status, headers, chunks = await loop.run_in_executor(self._executor, self._dispatch_sync, environ)
+
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+        })
+        await send({'type': 'http.response.body', 'body': b''.join(chunks)})
+
+    async def _send_too_large(self, send):
+        body = json.dumps({'error': 'Request body too large'}).encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': 413,
+            'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode('latin-1'))]
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    def _async_view(self, environ):
+        """Return the coroutine view function for this request, or None to use the WSGI path"""
+        if environ['REQUEST_METHOD'] == 'OPTIONS':
+            return None
+        try:
+            endpoint, _ = self.app.url_map.bind_to_environ(environ).match()
+        except HTTPException:
+            return None
+        view = self.app.view_functions.get(endpoint)
+        return view if inspect.iscoroutinefunction(view) else None
+
+    async def _dispatch_async(self, environ, view):
+        # Mirrors Flask.wsgi_app and full_dispatch_request, awaiting the view instead of wrapping it in async_to_sync
+        ctx = self.app.request_context(environ)
+        error = None
+        try:
+            try:
+                ctx.push()
+                self.app._got_first_request = True
+                try:
+                    request_started.send(self.app, _async_wrapper=self.app.ensure_sync)
+                    rv = self.app.preprocess_request()
+                    if rv is None:
+                        rv = await view(**request.view_args)
+                except Exception as e:
+                    rv = self.app.handle_user_exception(e)
+                # finalize_request sends request_finished
+                response = self.app.finalize_request(rv)
+            except Exception as e:
+                error = e
+                # Re-raises when exceptions propagate (debug or testing); the finally below still pops the context
+                response = self.app.handle_exception(e)
+            try:
+                return response.status_code, response.headers.to_wsgi_list(), list(response.iter_encoded())
+            finally:
+                response.close()
+        finally:
+            if error is not None and self.app.should_ignore_error(error):
+                error = None
+            ctx.pop(error)
+
+    def _dispatch_sync(self, environ):
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = headers
+
+        result = self.app.wsgi_app(environ, start_response)
+        try:
+            chunks = list(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return started['status'], started['headers'], chunks
+
+
+asgi_app = FlaskASGI(app)
@@ -11,6 +11,8 @@ from src.routes.legal import legal_bp
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
+# Uploads arrive as base64 JSON, about a third larger than the file itself
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_REQUEST_MB', 50)) * 1024 * 1024
 
 # Enable CORS for all routes
 CORS(app)
@@ -1,4 +1,4 @@
-from flask import Blueprint, jsonify, request, send_file
+from flask import Blueprint, jsonify, request, send_file, has_request_context
 from flask_cors import cross_origin
 import google.generativeai as genai
 import os
@@ -7,12 +7,14 @@ import base64
 import tempfile
 from fpdf import FPDF
 import json
-import io
-
-from PyPDF2 import PdfReader
-from docx import Document
+import asyncio
 
 from src.templates.agreement_templates import get_template_by_type, format_template
+from src.services.document_versions import compare_versions, batch_changes_for_prompt
+from src.services.workspace_index import WorkspaceIndex
+from src.services.executor import run_blocking, ASGI_ENVIRON_KEY
+from src.services.chat_history import ChatHistoryStore
+from src.services.extraction import extraction_service, PDF_TYPE, DOCX_TYPES
 
 legal_bp = Blueprint('legal', __name__)
 
@@ -20,25 +22,23 @@ legal_bp = Blueprint('legal', __name__)
 genai.configure(api_key=os.environ.get('GEMINI_API_KEY'))
 model = genai.GenerativeModel('gemini-1.5-flash')
 
-# In-memory storage for documents and chat history
+# In-memory storage for documents and workspaces; chat history is logged to disk
 documents = {}
-chat_histories = {}
+workspaces = {}
+chat_histories = ChatHistoryStore()
 
 # ------------------- Helper functions -------------------
 
-def extract_pdf_text(file_bytes):
-    reader = PdfReader(io.BytesIO(file_bytes))
-    text = ""
-    for page in reader.pages:
-        page_text = page.extract_text()
-        if page_text:
-            text += page_text + "\n"
-    return text
+async def generate_with_model(prompt):
+    """Call Gemini without blocking the event loop.
 
-def extract_docx_text(file_bytes):
-    doc = Document(io.BytesIO(file_bytes))
-    text = "\n".join([para.text for para in doc.paragraphs if para.text.strip()])
-    return text
+    The async client caches its gRPC channel on the first event loop it runs on, so it is
+    only used under src.asgi. Under WSGI, Flask gives every async view a fresh loop, and
+    the sync client runs in the blocking executor instead.
+    """
+    if has_request_context() and request.environ.get(ASGI_ENVIRON_KEY):
+        return await model.generate_content_async(prompt)
+    return await run_blocking(model.generate_content, prompt)
 
 def safe_format(template_str, data):
     """Safely format a string using keys in data. Missing keys replaced with placeholder."""
@@ -47,20 +47,87 @@ def safe_format(template_str, data):
             return f"{{{key}}}"
     return template_str.format_map(SafeDict(data))
 
+async def analyze_document(text_content, file_name):
+    analysis_prompt = f"""
+    Analyze this legal document and provide:
+    1. Document type identification
+    2. Key clauses and terms
+    3. Potential risks or issues
+    4. Summary of main points
+
+    Document content:
+    {text_content[:2000]}
+    """
+    
+    try:
+        response = await generate_with_model(analysis_prompt)
+        return response.text
+    except Exception:
+        return f"I've received your document '{file_name}'. This appears to be a legal document. How can I assist you?"
+
+async def analyze_revision(previous, text_content, file_name):
+    """Analyze only the clauses that changed since the previous version and merge into its analysis."""
+    changes, change_summary = await run_blocking(compare_versions, previous['content'], text_content)
+    version = previous.get('version', 1) + 1
+    
+    if not changes:
+        return version, previous['analysis'], change_summary
+    
+    batches, not_analyzed = batch_changes_for_prompt(changes)
+    change_summary['not_analyzed'] = not_analyzed
+    skipped_note = f"\n\nNote: {not_analyzed} more changed clauses were not analyzed." if not_analyzed else ""
+    
+    async def analyze_batch(number, batch):
+        revision_prompt = f"""
+        A new revision of a legal document has been uploaded. Review only the changed clauses below
+        (part {number} of {len(batches)}) and provide:
+        1. What changed and its legal effect
+        2. New or removed risks or issues
+        3. Whether the earlier analysis needs updating
+        {skipped_note}
+
+        Changed clauses:
+        {batch}
+        """
+        try:
+            response = await generate_with_model(revision_prompt)
+            return response.text
+        except Exception:
+            return None
+    
+    results = await asyncio.gather(*[analyze_batch(number, batch) for number, batch in enumerate(batches, start=1)])
+    analyses = [result for result in results if result]
+    if analyses:
+        revision_analysis = "\n\n".join(analyses)
+    else:
+        revision_analysis = (f"I've received version {version} of '{file_name}' with "
+                             f"{change_summary['added']} added, {change_summary['removed']} removed and "
+                             f"{change_summary['modified']} modified clauses.")
+    if len(analyses) < len(batches):
+        revision_analysis += f"\n\nNote: {len(batches) - len(analyses)} of {len(batches)} groups of changes could not be analyzed."
+    revision_analysis += skipped_note
+    
+    merged_analysis = f"{previous['analysis']}\n\n--- Changes in version {version} ---\n{revision_analysis}"
+    return version, merged_analysis, change_summary
+
 # ------------------- Upload Route -------------------
+# Async views skip @cross_origin(), which calls views synchronously; CORS(app) in main.py covers them.
 
 @legal_bp.route('/upload', methods=['POST'], endpoint='upload_document')
-@cross_origin()
-def upload_document():
+async def upload_document():
     try:
         data = request.json
         file_content = data.get('file_content')
         file_name = data.get('file_name')
         file_type = data.get('file_type')
+        previous_document_id = data.get('previous_document_id')
         
         if not file_content or not file_name:
             return jsonify({'error': 'Missing file content or name'}), 400
         
+        if previous_document_id and previous_document_id not in documents:
+            return jsonify({'error': 'Previous document not found'}), 404
+        
         document_id = str(uuid.uuid4())
         
         try:
@@ -68,53 +135,58 @@ def upload_document():
         except Exception:
             return jsonify({'error': 'Invalid base64 content'}), 400
         
+        extraction = None
         if file_type == 'text/plain':
             text_content = decoded_content.decode('utf-8')
-        elif file_type == 'application/pdf':
-            text_content = extract_pdf_text(decoded_content)
-        elif file_type in ['application/vnd.openxmlformats-officedocument.wordprocessingml.document', 'application/msword']:
-            text_content = extract_docx_text(decoded_content)
+        elif file_type == PDF_TYPE or file_type in DOCX_TYPES:
+            extraction = await extraction_service.extract(file_type, decoded_content)
+            if extraction['error'] and not extraction['text']:
+                return jsonify({'error': f"Could not extract document text: {extraction['error']}"}), 422
+            text_content = extraction['text']
         else:
             text_content = "Document uploaded successfully. Content analysis available."
         
-        analysis_prompt = f"""
-        Analyze this legal document and provide:
-        1. Document type identification
-        2. Key clauses and terms
-        3. Potential risks or issues
-        4. Summary of main points
-
-        Document content:
-        {text_content[:2000]}
-        """
-        
-        try:
-            response = model.generate_content(analysis_prompt)
-            initial_message = response.text
-        except Exception:
-            initial_message = f"I've received your document '{file_name}'. This appears to be a legal document. How can I assist you?"
+        if previous_document_id:
+            previous = documents[previous_document_id]
+            version, initial_message, change_summary = await analyze_revision(previous, text_content, file_name)
+        else:
+            version, change_summary = 1, None
+            initial_message = await analyze_document(text_content, file_name)
         
         documents[document_id] = {
             'file_name': file_name,
             'file_type': file_type,
             'content': text_content,
-            'analysis': initial_message
+            'analysis': initial_message,
+            'version': version,
+            'previous_document_id': previous_document_id
         }
-        chat_histories[document_id] = []
-        
-        return jsonify({
+        updated_workspaces = await run_blocking(reindex_revision, previous_document_id, document_id) if previous_document_id else []
+        response_data = {
             'document_id': document_id,
             'status': 'ready',
-            'initial_bot_message': initial_message
-        })
+            'initial_bot_message': initial_message,
+            'version': version
+        }
+        if change_summary is not None:
+            response_data['change_summary'] = change_summary
+        if updated_workspaces:
+            response_data['workspace_ids'] = updated_workspaces
+        if extraction and extraction['truncated']:
+            response_data['extraction'] = {
+                'truncated': True,
+                'timed_out': extraction['timed_out'],
+                'pages': extraction['pages'],
+                'pages_extracted': extraction['pages_extracted']
+            }
+        return jsonify(response_data)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 # ------------------- Chat Routes -------------------
 
 @legal_bp.route('/chat/upload', methods=['POST'], endpoint='chat_upload_document')
-@cross_origin()
-def chat_upload():
+async def chat_upload():
     try:
         data = request.json
         document_id = data.get('document_id')
@@ -127,7 +199,7 @@ def chat_upload():
             return jsonify({'error': 'Document not found'}), 404
         
         document = documents[document_id]
-        chat_history = chat_histories.get(document_id, [])
+        chat_history = await run_blocking(chat_histories.recent, document_id, 5)
         
         context = f"""
         Document: {document['file_name']}
@@ -135,25 +207,24 @@ def chat_upload():
         
         Previous conversation:
         """
-        for chat in chat_history[-5:]:
-            context += f"User: {chat['user']}\nAssistant: {chat['bot']}\n"
+        for chat in chat_history:
+            context += f"User: {chat.user}\nAssistant: {chat.bot}\n"
         
         context += f"\nUser: {message}\n\nPlease provide a helpful response based on the document content."
         
         try:
-            response = model.generate_content(context)
+            response = await generate_with_model(context)
             bot_response = response.text
         except Exception:
             bot_response = "I can help with document interpretation. Please clarify your question."
         
-        chat_histories[document_id].append({'user': message, 'bot': bot_response})
+        await run_blocking(chat_histories.append, document_id, message, bot_response)
         return jsonify({'bot_response': bot_response})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @legal_bp.route('/chat/general', methods=['POST'], endpoint='chat_general_document')
-@cross_origin()
-def chat_general():
+async def chat_general():
     try:
         data = request.json
         message = data.get('message')
@@ -166,7 +237,7 @@ def chat_general():
         {message}
         """
         try:
-            response = model.generate_content(prompt)
+            response = await generate_with_model(prompt)
             bot_response = response.text
         except Exception:
             bot_response = "Please provide more details so I can help with your legal question."
@@ -175,11 +246,154 @@ def chat_general():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@legal_bp.route('/chat/history/<conversation_id>', methods=['GET'], endpoint='chat_history_page')
+@cross_origin()
+def chat_history_page(conversation_id):
+    try:
+        if conversation_id not in documents and conversation_id not in workspaces:
+            return jsonify({'error': 'Conversation not found'}), 404
+        
+        before = request.args.get('before', type=int)
+        limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+        return jsonify(chat_histories.page(conversation_id, before=before, limit=limit))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# ------------------- Workspace Routes -------------------
+
+def workspace_to_dict(workspace_id, workspace):
+    return {
+        'workspace_id': workspace_id,
+        'name': workspace['name'],
+        'documents': workspace['index'].list_documents()
+    }
+
+def reindex_revision(previous_document_id, document_id):
+    """Swap a new revision into every workspace that indexed its previous version; returns their ids."""
+    document = documents[document_id]
+    updated = []
+    for workspace_id, workspace in list(workspaces.items()):
+        index = workspace['index']
+        if previous_document_id in index.document_ids():
+            index.replace_document(previous_document_id, document_id, document['file_name'], document['content'])
+            updated.append(workspace_id)
+    return updated
+
+@legal_bp.route('/workspaces', methods=['POST'], endpoint='create_workspace')
+@cross_origin()
+def create_workspace():
+    try:
+        data = request.json or {}
+        name = data.get('name') or 'Untitled workspace'
+        document_ids = data.get('document_ids') or []
+        
+        missing = [document_id for document_id in document_ids if document_id not in documents]
+        if missing:
+            return jsonify({'error': f"Documents not found: {', '.join(missing)}"}), 404
+        
+        workspace_id = str(uuid.uuid4())
+        index = WorkspaceIndex()
+        for document_id in document_ids:
+            document = documents[document_id]
+            index.add_document(document_id, document['file_name'], document['content'])
+        
+        workspaces[workspace_id] = {'name': name, 'index': index}
+        return jsonify(workspace_to_dict(workspace_id, workspaces[workspace_id])), 201
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@legal_bp.route('/workspaces/<workspace_id>', methods=['GET'], endpoint='get_workspace')
+@cross_origin()
+def get_workspace(workspace_id):
+    if workspace_id not in workspaces:
+        return jsonify({'error': 'Workspace not found'}), 404
+    return jsonify(workspace_to_dict(workspace_id, workspaces[workspace_id]))
+
+@legal_bp.route('/workspaces/<workspace_id>/documents', methods=['POST'], endpoint='add_workspace_document')
+@cross_origin()
+def add_workspace_document(workspace_id):
+    try:
+        data = request.json or {}
+        document_id = data.get('document_id')
+        
+        if workspace_id not in workspaces:
+            return jsonify({'error': 'Workspace not found'}), 404
+        if not document_id:
+            return jsonify({'error': 'Missing document_id'}), 400
+        if document_id not in documents:
+            return jsonify({'error': 'Document not found'}), 404
+        
+        workspace = workspaces[workspace_id]
+        document = documents[document_id]
+        workspace['index'].add_document(document_id, document['file_name'], document['content'])
+        return jsonify(workspace_to_dict(workspace_id, workspace))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@legal_bp.route('/workspaces/<workspace_id>/documents/<document_id>', methods=['DELETE'], endpoint='remove_workspace_document')
+@cross_origin()
+def remove_workspace_document(workspace_id, document_id):
+    try:
+        if workspace_id not in workspaces:
+            return jsonify({'error': 'Workspace not found'}), 404
+        
+        workspace = workspaces[workspace_id]
+        if not workspace['index'].remove_document(document_id):
+            return jsonify({'error': 'Document not in workspace'}), 404
+        return jsonify(workspace_to_dict(workspace_id, workspace))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@legal_bp.route('/chat/workspace', methods=['POST'], endpoint='chat_workspace_documents')
+async def chat_workspace():
+    try:
+        data = request.json
+        workspace_id = data.get('workspace_id')
+        message = data.get('message')
+        
+        if not workspace_id or not message:
+            return jsonify({'error': 'Missing workspace_id or message'}), 400
+        
+        if workspace_id not in workspaces:
+            return jsonify({'error': 'Workspace not found'}), 404
+        
+        workspace = workspaces[workspace_id]
+        citations = await run_blocking(workspace['index'].search, message)
+        
+        context = f"""
+        You are answering a question across the documents in the workspace '{workspace['name']}'.
+        Relevant excerpts:
+        """
+        for number, citation in enumerate(citations, start=1):
+            context += f"\n[{number}] {citation['file_name']} (excerpt {citation['chunk'] + 1}): {citation['text']}\n"
+        
+        context += "\nPrevious conversation:\n"
+        for chat in await run_blocking(chat_histories.recent, workspace_id, 5):
+            context += f"User: {chat.user}\nAssistant: {chat.bot}\n"
+        
+        context += f"\nUser: {message}\n\nPlease answer based on the excerpts and cite them by number, e.g. [1]."
+        
+        try:
+            response = await generate_with_model(context)
+            bot_response = response.text
+        except Exception:
+            bot_response = "I couldn't find a clear answer in this workspace. Please clarify your question."
+        
+        await run_blocking(chat_histories.append, workspace_id, message, bot_response)
+        return jsonify({
+            'bot_response': bot_response,
+            'citations': [
+                {key: citation[key] for key in ('document_id', 'file_name', 'chunk', 'score')}
+                for citation in citations
+            ]
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # ------------------- Agreement Generation -------------------
 
 @legal_bp.route('/generate-agreement', methods=['POST'], endpoint='generate_agreement_unique')
-@cross_origin()
-def generate_agreement_route():
+async def generate_agreement_route():
     try:
         data = request.json
         agreement_type = data.get('agreement_type')
@@ -195,8 +409,8 @@ def generate_agreement_route():
             section['content'] = safe_format(section['content'], form_data)
         template['signature_block'] = safe_format(template['signature_block'], form_data)
 
-        enhanced_content = enhance_agreement_with_ai(template, agreement_type, form_data)
-        pdf_path = generate_enhanced_pdf(enhanced_content, agreement_type, form_data)
+        enhanced_content = await enhance_agreement_with_ai(template, agreement_type, form_data)
+        pdf_path = await run_blocking(generate_enhanced_pdf, enhanced_content, agreement_type, form_data)
 
         return jsonify({'pdf_url': f'/download/{os.path.basename(pdf_path)}'})
     except Exception as e:
@@ -204,7 +418,7 @@ def generate_agreement_route():
 
 # ------------------- Helper Functions for Agreement -------------------
 
-def enhance_agreement_with_ai(template, agreement_type, form_data):
+async def enhance_agreement_with_ai(template, agreement_type, form_data):
     prompt = f"""
     Review and enhance this {agreement_type} agreement template. Add missing important clauses 
     while keeping structure intact.
@@ -218,7 +432,7 @@ def enhance_agreement_with_ai(template, agreement_type, form_data):
     prompt += f"\nForm Data: {json.dumps(form_data, indent=2)}"
 
     try:
-        response = model.generate_content(prompt)
+        response = await generate_with_model(prompt)
         ai_suggestions = response.text
         enhanced_template = template.copy()
         enhanced_template['ai_suggestions'] = ai_suggestions
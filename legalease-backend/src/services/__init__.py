@@ -0,0 +1,2 @@
+# Services package for LegalEase AI Backend
+
@@ -0,0 +1,267 @@
+"""
+Chat History Store
+This module keeps chat turns in an append-only log on disk per conversation and
+holds only a small window of recent, compact turns in memory, so memory per
+conversation stays flat however long the chat runs. Idle conversations are
+dropped from memory and old logs are deleted from disk.
+"""
+
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import zlib
+from collections import deque
+
+CHAT_HISTORY_DIR = os.environ.get('CHAT_HISTORY_DIR', os.path.join(tempfile.gettempdir(), 'legalease-chat'))
+CHAT_HISTORY_WINDOW = int(os.environ.get('CHAT_HISTORY_WINDOW', 5))
+CHAT_HISTORY_MAX_TURNS = int(os.environ.get('CHAT_HISTORY_MAX_TURNS', 1000))
+CHAT_HISTORY_COMPRESS_MIN = int(os.environ.get('CHAT_HISTORY_COMPRESS_MIN', 512))
+CHAT_HISTORY_MAX_AGE_DAYS = float(os.environ.get('CHAT_HISTORY_MAX_AGE_DAYS', 30))
+CHAT_HISTORY_IDLE_SECONDS = int(os.environ.get('CHAT_HISTORY_IDLE_SECONDS', 1800))
+CHAT_HISTORY_PRUNE_INTERVAL = int(os.environ.get('CHAT_HISTORY_PRUNE_INTERVAL', 300))
+
+CONVERSATION_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]+$')
+# page() reads logs backwards in blocks of this many bytes
+READ_BLOCK_SIZE = 64 * 1024
+
+
+def _pack(text, compress_min):
+    data = text.encode('utf-8')
+    if compress_min and len(data) >= compress_min:
+        return zlib.compress(data)
+    return text
+
+
+def _unpack(value):
+    if isinstance(value, bytes):
+        return zlib.decompress(value).decode('utf-8')
+    return value
+
+
+def _parse_record(line):
+    """Parse one log line, or return None for a line left corrupt by a crash mid-write"""
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    return record if isinstance(record, dict) and 'turn' in record else None
+
+
+class ChatTurn:
+    """One user/bot exchange; long bodies are held zlib-compressed"""
+    __slots__ = ('turn', 'timestamp', '_user', '_bot')
+
+    def __init__(self, turn, timestamp, user, bot, compress_min=CHAT_HISTORY_COMPRESS_MIN):
+        self.turn = turn
+        self.timestamp = timestamp
+        self._user = _pack(user, compress_min)
+        self._bot = _pack(bot, compress_min)
+
+    @property
+    def user(self):
+        return _unpack(self._user)
+
+    @property
+    def bot(self):
+        return _unpack(self._bot)
+
+    def to_dict(self):
+        return {'turn': self.turn, 'timestamp': self.timestamp, 'user': self.user, 'bot': self.bot}
+
+
+class ChatHistoryStore:
+    """Append-only per-conversation chat logs with an in-memory window of recent turns"""
+
+    def __init__(self, directory=CHAT_HISTORY_DIR, window=CHAT_HISTORY_WINDOW,
+                 max_turns=CHAT_HISTORY_MAX_TURNS, compress_min=CHAT_HISTORY_COMPRESS_MIN,
+                 max_age_days=CHAT_HISTORY_MAX_AGE_DAYS, idle_seconds=CHAT_HISTORY_IDLE_SECONDS,
+                 prune_interval=CHAT_HISTORY_PRUNE_INTERVAL):
+        self.directory = directory
+        self.window = window
+        self.max_turns = max_turns
+        self.compress_min = compress_min
+        self.max_age_days = max_age_days
+        self.idle_seconds = idle_seconds
+        self.prune_interval = prune_interval
+        # conversation_id -> {'lock', 'recent': deque of ChatTurn or None until loaded, 'next_turn', 'stored', 'last_used'}
+        self._conversations = {}
+        # Guards _conversations only; each conversation's log and window are guarded by its own lock
+        self._lock = threading.Lock()
+        self._last_prune = time.monotonic()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, conversation_id):
+        if not CONVERSATION_ID_PATTERN.match(conversation_id):
+            raise ValueError(f"Invalid conversation id: {conversation_id}")
+        return os.path.join(self.directory, f"{conversation_id}.jsonl")
+
+    def _read_records(self, conversation_id):
+        path = self._path(conversation_id)
+        if not os.path.exists(path):
+            return
+        with open(path, 'rb') as log:
+            for line in log:
+                # A line without its newline is still being appended, or was torn by a crash; skip it
+                if not line.endswith(b'\n'):
+                    continue
+                record = _parse_record(line)
+                if record is not None:
+                    yield record
+
+    def _read_records_reversed(self, conversation_id, block_size=READ_BLOCK_SIZE):
+        """Yield the log's records newest first, reading the file backwards in blocks"""
+        try:
+            log = open(self._path(conversation_id), 'rb')
+        except FileNotFoundError:
+            return
+        with log:
+            position = log.seek(0, os.SEEK_END)
+            # Bytes at the start of the region read so far, not yet known to begin a line
+            pending = b''
+            seen_newline = False
+            while position > 0:
+                step = min(block_size, position)
+                position -= step
+                log.seek(position)
+                lines = (log.read(step) + pending).split(b'\n')
+                pending = lines.pop(0)
+                if lines and not seen_newline:
+                    # Whatever follows the last newline is an unfinished append
+                    lines.pop()
+                    seen_newline = True
+                for line in reversed(lines):
+                    record = _parse_record(line)
+                    if record is not None:
+                        yield record
+            if seen_newline:
+                record = _parse_record(pending)
+                if record is not None:
+                    yield record
+
+    def _has_torn_tail(self, conversation_id):
+        """Return True if the log ends in a partial line, e.g. after a crash mid-append"""
+        try:
+            with open(self._path(conversation_id), 'rb') as log:
+                if log.seek(0, os.SEEK_END) == 0:
+                    return False
+                log.seek(-1, os.SEEK_END)
+                return log.read(1) != b'\n'
+        except FileNotFoundError:
+            return False
+
+    def _state(self, conversation_id):
+        """Return the conversation's state, loading its recent window from the log on first use"""
+        with self._lock:
+            state = self._conversations.get(conversation_id)
+            if state is None:
+                state = {'lock': threading.Lock(), 'recent': None, 'next_turn': 0, 'stored': 0, 'torn_tail': False}
+                self._conversations[conversation_id] = state
+            state['last_used'] = time.monotonic()
+
+        with state['lock']:
+            if state['recent'] is None:
+                recent = deque(maxlen=self.window)
+                for record in self._read_records(conversation_id):
+                    recent.append(ChatTurn(record['turn'], record['timestamp'], record['user'], record['bot'], self.compress_min))
+                    state['next_turn'] = record['turn'] + 1
+                    state['stored'] += 1
+                state['torn_tail'] = self._has_torn_tail(conversation_id)
+                state['recent'] = recent
+        return state
+
+    def append(self, conversation_id, user, bot):
+        """Record a turn in memory and append it to the conversation log"""
+        state = self._state(conversation_id)
+        with state['lock']:
+            turn = ChatTurn(state['next_turn'], time.time(), user, bot, self.compress_min)
+            state['recent'].append(turn)
+            state['next_turn'] += 1
+            with open(self._path(conversation_id), 'a', encoding='utf-8') as log:
+                # End a torn line first so the new record isn't glued onto it
+                log.write(('\n' if state['torn_tail'] else '') + json.dumps(turn.to_dict()) + '\n')
+            state['torn_tail'] = False
+            state['stored'] += 1
+            if self.max_turns and state['stored'] > self.max_turns + max(1, self.max_turns // 10):
+                self._compact(conversation_id, state)
+        self._maybe_prune()
+        return turn
+
+    def _compact(self, conversation_id, state):
+        """Rewrite the log keeping only the newest max_turns turns"""
+        kept = deque(self._read_records(conversation_id), maxlen=self.max_turns)
+        path = self._path(conversation_id)
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as log:
+            for record in kept:
+                log.write(json.dumps(record) + '\n')
+        os.replace(temp_path, path)
+        state['stored'] = len(kept)
+        state['torn_tail'] = False
+
+    def recent(self, conversation_id, k=None):
+        """Return the last k turns (at most the window size), oldest first"""
+        state = self._state(conversation_id)
+        with state['lock']:
+            turns = list(state['recent'])
+        if k is None:
+            return turns
+        return turns[-k:] if k > 0 else []
+
+    def page(self, conversation_id, before=None, limit=20):
+        """Return up to limit turns older than the turn number before, newest first
+
+        The log is read backwards from its end and reading stops one record past
+        the page, so recent pages are cheap; the cost of a page grows with how far
+        back it is, up to one pass over the log (at most max_turns records).
+        next_before is None once there are no older turns.
+        """
+        if before is None:
+            before = self._state(conversation_id)['next_turn']
+        # Read without holding any lock; compaction swaps the file atomically and appends only add whole lines
+        turns = []
+        for record in self._read_records_reversed(conversation_id):
+            if record['turn'] < before:
+                turns.append(record)
+                if len(turns) > limit:
+                    break
+        has_more = len(turns) > limit
+        turns = turns[:limit]
+        next_before = turns[-1]['turn'] if has_more else None
+        return {'turns': turns, 'next_before': next_before}
+
+    def _maybe_prune(self):
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_prune < self.prune_interval:
+                return
+            self._last_prune = now
+        self.prune()
+
+    def prune(self):
+        """Drop idle conversations from memory and delete logs older than max_age_days"""
+        now = time.monotonic()
+        with self._lock:
+            for conversation_id, state in list(self._conversations.items()):
+                if self.idle_seconds and now - state['last_used'] > self.idle_seconds and not state['lock'].locked():
+                    del self._conversations[conversation_id]
+
+        if not self.max_age_days:
+            return
+        cutoff = time.time() - self.max_age_days * 86400
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.name.endswith('.jsonl') or entry.stat().st_mtime >= cutoff:
+                    continue
+                conversation_id = entry.name[:-len('.jsonl')]
+                with self._lock:
+                    state = self._conversations.get(conversation_id)
+                    if state is not None and state['lock'].locked():
+                        continue
+                    self._conversations.pop(conversation_id, None)
+                    try:
+                        os.remove(entry.path)
+                    except FileNotFoundError:
+                        pass
@@ -0,0 +1,178 @@
+"""
+Document Versioning Helpers
+This module splits legal documents into clauses and diffs a revision against the
+stored version so that only changed clauses need to be sent for AI analysis.
+"""
+
+import difflib
+import itertools
+import re
+
+# Lines that start a new clause: "1.", "2.3)", "(a)", "(iv)", "Section 5", "Article II"
+CLAUSE_START = re.compile(
+    r'^\s*(?:(?:section|article|clause)\s+[0-9ivxlc]+(?:\.\d+)*\b|\d+(?:\.\d+)*[.)]\s|\(?[a-z]\)\s|\([ivx]+\)\s)',
+    re.IGNORECASE
+)
+# Short all-caps lines without sentence punctuation, e.g. "CONFIDENTIALITY"
+HEADING_LINE = re.compile(r"^\s*[A-Z][A-Z0-9 &'/\-]{2,60}\s*$")
+# "Page 3", "Page 3 of 10" or "3 of 10" on a line of its own
+PAGE_LABEL_LINE = re.compile(r'^\s*(?:page\s+\d+(?:\s+of\s+\d+)?|\d+\s+of\s+\d+)\s*$', re.IGNORECASE)
+# A bare number could be a page number or a wrapped figure such as "30" days, so it needs more evidence
+BARE_NUMBER_LINE = re.compile(r'^\s*(\d+)\s*$')
+# A short line repeated this many times is treated as a running page header or footer
+RUNNING_HEADER_REPEATS = 3
+CLAUSE_SEPARATOR = re.compile(r'\n\s*\n')
+
+# Changed clauses are sent to the model in batches of this many characters, up to this many batches
+REVISION_BATCH_CHARS = 2000
+REVISION_MAX_BATCHES = 5
+
+
+def _strip_page_furniture(lines):
+    """Drop page numbers and running headers/footers that extracted PDF text repeats on every page
+
+    A bare number line is only treated as a page number when it sits next to a
+    running header or continues a page sequence (an earlier n - 1 or a later n + 1).
+    """
+    counts = {}
+    numbers = []
+    for index, line in enumerate(lines):
+        key = line.strip()
+        match = BARE_NUMBER_LINE.match(line)
+        if match:
+            numbers.append((index, int(match.group(1))))
+        elif key and len(key) < 80:
+            counts[key] = counts.get(key, 0) + 1
+
+    def is_header(index):
+        return counts.get(lines[index].strip(), 0) >= RUNNING_HEADER_REPEATS
+
+    first_seen = {}
+    last_seen = {}
+    for index, value in numbers:
+        first_seen.setdefault(value, index)
+        last_seen[value] = index
+
+    def next_to_header(index):
+        for step in (-1, 1):
+            other = index + step
+            while 0 <= other < len(lines) and not lines[other].strip():
+                other += step
+            if 0 <= other < len(lines) and is_header(other):
+                return True
+        return False
+
+    drop = {index for index, line in enumerate(lines) if PAGE_LABEL_LINE.match(line) or is_header(index)}
+    for index, value in numbers:
+        if (first_seen.get(value - 1, index) < index
+                or last_seen.get(value + 1, index) > index
+                or next_to_header(index)):
+            drop.add(index)
+    return [line for index, line in enumerate(lines) if index not in drop]
+
+
+def split_clauses(text):
+    """Split document text into a list of normalized clauses
+
+    Clauses start at numbered or lettered clause markers and all-caps headings.
+    Blank lines also end a clause. Text with no markers is split on blank lines,
+    and text with no blank lines either falls back to one clause per line.
+    """
+    if not text:
+        return []
+    lines = _strip_page_furniture(text.split('\n'))
+    starts = sum(1 for line in lines if CLAUSE_START.match(line) or HEADING_LINE.match(line))
+    if starts >= 2:
+        parts = []
+        current = []
+        for line in lines:
+            if not line.strip() or CLAUSE_START.match(line) or HEADING_LINE.match(line):
+                if current:
+                    parts.append(' '.join(current))
+                current = []
+            if line.strip():
+                current.append(line)
+        if current:
+            parts.append(' '.join(current))
+    else:
+        parts = CLAUSE_SEPARATOR.split('\n'.join(lines))
+        if len(parts) == 1:
+            parts = lines
+    return [' '.join(part.split()) for part in parts if part.strip()]
+
+
+def diff_clauses(old_clauses, new_clauses):
+    """Return the list of changed clause groups between two versions"""
+    matcher = difflib.SequenceMatcher(None, old_clauses, new_clauses, autojunk=False)
+    changes = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+        change_type = {'replace': 'modified', 'delete': 'removed', 'insert': 'added'}[tag]
+        changes.append({
+            'type': change_type,
+            'old': old_clauses[i1:i2],
+            'new': new_clauses[j1:j2],
+            'position': j1
+        })
+    return changes
+
+
+def compare_versions(old_text, new_text):
+    """Split and diff two versions of a document; returns (changes, change summary)"""
+    old_clauses = split_clauses(old_text)
+    new_clauses = split_clauses(new_text)
+    changes = diff_clauses(old_clauses, new_clauses)
+    return changes, summarize_changes(changes, len(old_clauses), len(new_clauses))
+
+
+def summarize_changes(changes, old_count, new_count):
+    """Build a short summary of the changes between two versions"""
+    counts = {'added': 0, 'removed': 0, 'modified': 0}
+    for change in changes:
+        if change['type'] == 'added':
+            counts['added'] += len(change['new'])
+        elif change['type'] == 'removed':
+            counts['removed'] += len(change['old'])
+        else:
+            counts['modified'] += max(len(change['old']), len(change['new']))
+
+    return {
+        'clauses_before': old_count,
+        'clauses_after': new_count,
+        'added': counts['added'],
+        'removed': counts['removed'],
+        'modified': counts['modified'],
+        'not_analyzed': 0,
+        'unchanged': not changes
+    }
+
+
+def _change_units(change):
+    """Render a change group as prompt lines, one unit per clause (or before/after pair)"""
+    if change['type'] == 'added':
+        return [f"ADDED: {clause}" for clause in change['new']]
+    if change['type'] == 'removed':
+        return [f"REMOVED: {clause}" for clause in change['old']]
+    pairs = itertools.zip_longest(change['old'], change['new'])
+    return ["\n".join(line for line in (before and f"BEFORE: {before}", after and f"AFTER: {after}") if line)
+            for before, after in pairs]
+
+
+def batch_changes_for_prompt(changes, batch_chars=REVISION_BATCH_CHARS, max_batches=REVISION_MAX_BATCHES):
+    """Group changed clauses into prompt-sized batches; returns (batches, number of clause changes left out)"""
+    units = [unit for change in changes for unit in _change_units(change)]
+    batches = []
+    current = ''
+    for index, unit in enumerate(units):
+        # Only a single clause longer than a whole batch is cut to fit
+        unit = unit[:batch_chars]
+        if current and len(current) + len(unit) + 1 > batch_chars:
+            batches.append(current)
+            current = ''
+            if len(batches) == max_batches:
+                return batches, len(units) - index
+        current = f"{current}\n{unit}" if current else unit
+    if current:
+        batches.append(current)
+    return batches, 0
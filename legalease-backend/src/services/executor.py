@@ -0,0 +1,25 @@
+"""
+Blocking Work Executor
+This module offloads blocking work such as PDF rendering, clause diffing,
+workspace search and chat log I/O from async views to a shared thread pool, so
+the event loop stays free to serve other in-flight model calls. Text extraction
+runs in its own process pool (see extraction.py).
+"""
+
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Set in the WSGI environ by src.asgi, whose event loop lives as long as the server
+ASGI_ENVIRON_KEY = 'legalease.asgi'
+
+BLOCKING_WORKERS = int(os.environ.get('BLOCKING_WORKERS', min(32, (os.cpu_count() or 1) + 4)))
+
+_executor = ThreadPoolExecutor(max_workers=BLOCKING_WORKERS, thread_name_prefix='legalease-blocking')
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run func(*args, **kwargs) in the shared executor and await its result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
@@ -0,0 +1,309 @@
+"""
+Document Extraction Service
+This module extracts text from uploaded PDF and DOCX files in a pre-warmed pool of
+worker processes. Each job runs under CPU-time, wall-clock and memory caps with a
+page-count ceiling, and returns whatever text it has gathered if it hits a limit.
+Workers are recycled after a fixed number of jobs to shed leaked memory.
+"""
+
+import asyncio
+import io
+import itertools
+import multiprocessing
+import os
+import signal
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    import resource
+except ImportError:  # resource limits are only available on Unix
+    resource = None
+
+EXTRACTION_WORKERS = int(os.environ.get('EXTRACTION_WORKERS', 2))
+EXTRACTION_JOBS_PER_WORKER = int(os.environ.get('EXTRACTION_JOBS_PER_WORKER', 50))
+EXTRACTION_TIMEOUT = float(os.environ.get('EXTRACTION_TIMEOUT', 20))
+EXTRACTION_CPU_SECONDS = int(os.environ.get('EXTRACTION_CPU_SECONDS', 15))
+EXTRACTION_MAX_MEMORY_MB = int(os.environ.get('EXTRACTION_MAX_MEMORY_MB', 1024))
+EXTRACTION_MAX_PAGES = int(os.environ.get('EXTRACTION_MAX_PAGES', 500))
+
+PDF_TYPE = 'application/pdf'
+DOCX_TYPES = ['application/vnd.openxmlformats-officedocument.wordprocessingml.document', 'application/msword']
+
+
+class ExtractionLimitExceeded(Exception):
+    """Raised inside a worker when a job runs out of CPU or wall-clock time"""
+
+
+# ------------------- Worker side -------------------
+
+# Queue on which each worker reports (job_id, pid) when it picks up a job
+_job_starts = None
+
+
+def _raise_limit(signum, frame):
+    raise ExtractionLimitExceeded(signal.Signals(signum).name)
+
+
+def _init_worker(max_memory_mb, job_starts):
+    global _job_starts
+    _job_starts = job_starts
+
+    # Import parsers once per worker so the first job doesn't pay for it
+    import PyPDF2  # noqa: F401
+    import docx  # noqa: F401
+
+    signal.signal(signal.SIGALRM, _raise_limit)
+    if resource is not None:
+        signal.signal(signal.SIGXCPU, _raise_limit)
+        if max_memory_mb:
+            limit = max_memory_mb * 1024 * 1024
+            _, hard = resource.getrlimit(resource.RLIMIT_AS)
+            if hard != resource.RLIM_INFINITY:
+                limit = min(limit, hard)
+            resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+
+def _set_limits(cpu_seconds, timeout):
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    if resource is not None and cpu_seconds:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        used = int(usage.ru_utime + usage.ru_stime)
+        _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        soft = used + cpu_seconds
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _clear_limits():
+    signal.setitimer(signal.ITIMER_REAL, 0)
+    if resource is not None:
+        _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        resource.setrlimit(resource.RLIMIT_CPU, (hard, hard))
+
+
+def _extract_pdf_pages(file_bytes, max_pages, parts, result):
+    from PyPDF2 import PdfReader
+    reader = PdfReader(io.BytesIO(file_bytes))
+    # Record the page count up front so a job cut short still reports document size
+    page_count = len(reader.pages)
+    result['pages'] = page_count
+    result['pages_extracted'] = 0
+    result['truncated'] = page_count > max_pages
+    for index in range(min(page_count, max_pages)):
+        page_text = reader.pages[index].extract_text()
+        if page_text:
+            parts.append(page_text + "\n")
+        result['pages_extracted'] = index + 1
+
+
+def _extract_docx_paragraphs(file_bytes, parts, result):
+    from docx import Document
+    doc = Document(io.BytesIO(file_bytes))
+    for para in doc.paragraphs:
+        if para.text.strip():
+            parts.append(para.text)
+
+
+def run_extraction_job(job_id, file_type, file_bytes, max_pages, cpu_seconds, timeout):
+    """Extract text from one file inside a worker, returning partial text on limits"""
+    if _job_starts is not None:
+        _job_starts.put((job_id, os.getpid()))
+    parts = []
+    result = {'pages': None, 'pages_extracted': None, 'truncated': False, 'timed_out': False, 'error': None}
+    _set_limits(cpu_seconds, timeout)
+    try:
+        if file_type == PDF_TYPE:
+            _extract_pdf_pages(file_bytes, max_pages, parts, result)
+        else:
+            _extract_docx_paragraphs(file_bytes, parts, result)
+    except ExtractionLimitExceeded:
+        result['timed_out'] = True
+        result['truncated'] = True
+    except MemoryError:
+        result['error'] = 'Memory limit exceeded'
+        result['truncated'] = True
+    except Exception as e:
+        result['error'] = str(e)
+    finally:
+        _clear_limits()
+
+    separator = "" if file_type == PDF_TYPE else "\n"
+    result['text'] = separator.join(parts)
+    return result
+
+
+def _warm_up():
+    return os.getpid()
+
+
+# ------------------- Parent side -------------------
+
+class _JobSlots:
+    """Counting semaphore shared by coroutines on any event loop
+
+    Under WSGI, Flask runs each async view on its own event loop, so an
+    asyncio.Semaphore (bound to one loop) can't be shared across requests.
+    Waiters park as futures on their own loop rather than in a thread, and a
+    waiter that is cancelled never keeps a slot.
+    """
+
+    def __init__(self, size):
+        self._free = size
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._free and not self._waiters:
+                self._free -= 1
+                return
+            waiter = loop.create_future()
+            self._waiters.append((loop, waiter))
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot arrived just as we were cancelled
+                self.release()
+            else:
+                with self._lock:
+                    if (loop, waiter) in self._waiters:
+                        self._waiters.remove((loop, waiter))
+                # Otherwise release() already picked this waiter, and _grant passes the slot on
+            raise
+
+    def release(self):
+        with self._lock:
+            while self._waiters:
+                loop, waiter = self._waiters.popleft()
+                try:
+                    loop.call_soon_threadsafe(self._grant, waiter)
+                    return
+                except RuntimeError:  # the waiter's loop has closed
+                    continue
+            self._free += 1
+
+    def _grant(self, waiter):
+        if waiter.done():
+            self.release()
+        else:
+            waiter.set_result(None)
+
+
+class ExtractionService:
+    """Pre-warmed process pool that runs extraction jobs with resource limits"""
+
+    def __init__(self, workers=EXTRACTION_WORKERS, jobs_per_worker=EXTRACTION_JOBS_PER_WORKER,
+                 timeout=EXTRACTION_TIMEOUT, cpu_seconds=EXTRACTION_CPU_SECONDS,
+                 max_memory_mb=EXTRACTION_MAX_MEMORY_MB, max_pages=EXTRACTION_MAX_PAGES):
+        self.workers = workers
+        self.jobs_per_worker = jobs_per_worker
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.max_memory_mb = max_memory_mb
+        self.max_pages = max_pages
+        self._pool = None
+        self._lock = threading.Lock()
+        # One slot per worker, so a job's deadline only starts once a worker is free to run it
+        self._slots = _JobSlots(workers)
+        self._job_ids = itertools.count()
+        self._job_starts = None
+        self._job_pids = {}
+
+    def _create_pool(self):
+        context = multiprocessing.get_context('spawn')
+        if self._job_starts is None:
+            self._job_starts = context.SimpleQueue()
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(self.max_memory_mb, self._job_starts),
+            max_tasks_per_child=self.jobs_per_worker or None
+        )
+
+    def start(self):
+        """Create the pool and start every worker ahead of the first upload"""
+        with self._lock:
+            if self._pool is None:
+                self._pool = self._create_pool()
+            pool = self._pool
+        for future in [pool.submit(_warm_up) for _ in range(self.workers)]:
+            future.result()
+
+    def _restart(self, broken_pool):
+        with self._lock:
+            if self._pool is not broken_pool:
+                return
+            self._pool = self._create_pool()
+        broken_pool.shutdown(wait=False, cancel_futures=True)
+
+    def _pop_job_pid(self, job_id):
+        with self._lock:
+            while self._job_starts is not None and not self._job_starts.empty():
+                started_id, pid = self._job_starts.get()
+                self._job_pids[started_id] = pid
+            return self._job_pids.pop(job_id, None)
+
+    def _kill_stuck_job(self, pool, job_id):
+        """Kill the worker running job_id; jobs on its sibling workers are retried by their callers"""
+        pid = self._pop_job_pid(job_id)
+        if pid is not None:
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        else:
+            for process in list((getattr(pool, '_processes', None) or {}).values()):
+                process.terminate()
+        self._restart(pool)
+
+    def _submit(self, file_type, file_bytes):
+        with self._lock:
+            if self._pool is None:
+                self._pool = self._create_pool()
+            pool = self._pool
+        job_id = next(self._job_ids)
+        future = pool.submit(run_extraction_job, job_id, file_type, file_bytes,
+                             self.max_pages, self.cpu_seconds, self.timeout)
+        return pool, job_id, future
+
+    async def extract(self, file_type, file_bytes):
+        """Extract text from a PDF or DOCX file without blocking the event loop"""
+        await self._slots.acquire()
+        try:
+            # A job is retried once if its pool broke because a different worker was killed or crashed
+            for _ in range(2):
+                pool, job_id, future = self._submit(file_type, file_bytes)
+                try:
+                    # Workers enforce the timeout themselves; the grace period covers a stuck worker
+                    return await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout + 5)
+                except asyncio.TimeoutError:
+                    self._kill_stuck_job(pool, job_id)
+                    return {'text': '', 'pages': None, 'pages_extracted': None, 'truncated': True, 'timed_out': True,
+                            'error': 'Extraction worker did not respond'}
+                except ExtractionLimitExceeded:
+                    # The limit fired just as the job finished; the worker itself is still usable
+                    return {'text': '', 'pages': None, 'pages_extracted': None, 'truncated': True, 'timed_out': True,
+                            'error': None}
+                except BrokenProcessPool:
+                    self._restart(pool)
+                finally:
+                    self._pop_job_pid(job_id)
+            return {'text': '', 'pages': None, 'pages_extracted': None, 'truncated': True, 'timed_out': False,
+                    'error': 'Extraction worker crashed'}
+        finally:
+            self._slots.release()
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+extraction_service = ExtractionService()
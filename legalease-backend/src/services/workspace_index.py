@@ -0,0 +1,163 @@
+"""
+Workspace Index
+This module keeps one combined lexical (BM25) index over all documents in a workspace,
+so chat turns can retrieve citations across a master agreement, its SOWs and amendments
+without re-reading every document per question.
+"""
+
+import math
+import re
+import threading
+from collections import Counter
+
+from src.services.document_versions import split_clauses
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOP_WORDS = frozenset([
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'is', 'it',
+    'of', 'on', 'or', 'shall', 'that', 'the', 'this', 'to', 'was', 'will', 'with'
+])
+
+CHUNK_SIZE = 800
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text):
+    """Lowercase text and split it into index terms"""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOP_WORDS]
+
+
+def chunk_text(text, chunk_size=CHUNK_SIZE):
+    """Group consecutive clauses into chunks of roughly chunk_size characters"""
+    chunks = []
+    current = ''
+    for clause in split_clauses(text):
+        if current and len(current) + len(clause) + 1 > chunk_size:
+            chunks.append(current)
+            current = ''
+        current = f"{current} {clause}" if current else clause
+        while len(current) > chunk_size:
+            chunks.append(current[:chunk_size])
+            current = current[chunk_size:]
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class WorkspaceIndex:
+    """Inverted index over the chunks of every document in a workspace"""
+
+    def __init__(self):
+        # term -> {(document_id, chunk_no): term frequency}
+        self.postings = {}
+        # (document_id, chunk_no) -> (chunk text, chunk length in terms)
+        self.chunks = {}
+        # document_id -> {'file_name', 'chunk_count', 'terms'}
+        self.documents = {}
+        self.total_length = 0
+        # Routes add, remove and search from different threads
+        self._lock = threading.Lock()
+
+    def document_ids(self):
+        with self._lock:
+            return list(self.documents)
+
+    def list_documents(self):
+        with self._lock:
+            return [{'document_id': document_id, 'file_name': entry['file_name']}
+                    for document_id, entry in self.documents.items()]
+
+    def add_document(self, document_id, file_name, text):
+        """Index a document's chunks; re-adding a document replaces its previous entry"""
+        self.replace_document(document_id, document_id, file_name, text)
+
+    def replace_document(self, old_document_id, document_id, file_name, text):
+        """Swap old_document_id for document_id in one step, so searches never see neither or both"""
+        # Tokenize outside the lock so searches aren't held up by indexing
+        chunks = [(chunk, Counter(tokenize(chunk))) for chunk in chunk_text(text)]
+
+        with self._lock:
+            self._remove(old_document_id)
+            if document_id != old_document_id:
+                self._remove(document_id)
+
+            document_terms = set()
+            for chunk_no, (chunk, term_counts) in enumerate(chunks):
+                key = (document_id, chunk_no)
+                length = sum(term_counts.values())
+                self.chunks[key] = (chunk, length)
+                self.total_length += length
+                for term, count in term_counts.items():
+                    self.postings.setdefault(term, {})[key] = count
+                document_terms.update(term_counts)
+
+            self.documents[document_id] = {
+                'file_name': file_name,
+                'chunk_count': len(chunks),
+                'terms': document_terms
+            }
+
+    def remove_document(self, document_id):
+        """Drop a document's postings, touching only the terms it contains"""
+        with self._lock:
+            return self._remove(document_id)
+
+    def _remove(self, document_id):
+        entry = self.documents.pop(document_id, None)
+        if entry is None:
+            return False
+
+        keys = [(document_id, chunk_no) for chunk_no in range(entry['chunk_count'])]
+        for term in entry['terms']:
+            term_postings = self.postings.get(term)
+            if term_postings is None:
+                continue
+            for key in keys:
+                term_postings.pop(key, None)
+            if not term_postings:
+                del self.postings[term]
+        for key in keys:
+            _, length = self.chunks.pop(key)
+            self.total_length -= length
+        return True
+
+    def search(self, query, limit=8, char_budget=3000):
+        """Return the best matching chunks across documents, within a total character budget"""
+        with self._lock:
+            if not self.chunks:
+                return []
+
+            chunk_count = len(self.chunks)
+            average_length = self.total_length / chunk_count or 1
+            scores = {}
+            for term in set(tokenize(query)):
+                term_postings = self.postings.get(term)
+                if not term_postings:
+                    continue
+                idf = math.log(1 + (chunk_count - len(term_postings) + 0.5) / (len(term_postings) + 0.5))
+                for key, frequency in term_postings.items():
+                    length = self.chunks[key][1]
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+                    scores[key] = scores.get(key, 0.0) + idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+
+            results = []
+            used = 0
+            for key in sorted(scores, key=scores.get, reverse=True):
+                if len(results) >= limit:
+                    break
+                text = self.chunks[key][0]
+                remaining = char_budget - used
+                if remaining <= 0:
+                    break
+                snippet = text[:remaining]
+                used += len(snippet)
+                document_id, chunk_no = key
+                results.append({
+                    'document_id': document_id,
+                    'file_name': self.documents[document_id]['file_name'],
+                    'chunk': chunk_no,
+                    'score': round(scores[key], 4),
+                    'text': snippet
+                })
+            return results
@@ -0,0 +1,61 @@
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.asgi import asgi_app
+import src.routes.legal as legal
+
+
+class FakeResponse:
+    text = 'ok'
+
+
+async def call_chat_general(message):
+    body = json.dumps({'message': message}).encode('utf-8')
+    scope = {
+        'type': 'http',
+        'method': 'POST',
+        'path': '/api/chat/general',
+        'root_path': '',
+        'query_string': b'',
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())],
+        'http_version': '1.1',
+        'scheme': 'http',
+        'server': ('testserver', 80),
+        'client': ('127.0.0.1', 12345),
+    }
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    await asgi_app(scope, receive, send)
+    return sent
+
+
+def test_concurrent_chats_share_the_event_loop(monkeypatch):
+    async def slow_generate(prompt):
+        await asyncio.sleep(1)
+        return FakeResponse()
+
+    monkeypatch.setattr(legal.model, 'generate_content_async', slow_generate)
+
+    async def run():
+        start = time.monotonic()
+        results = await asyncio.gather(*[call_chat_general(f'question {i}') for i in range(200)])
+        return time.monotonic() - start, results
+
+    elapsed, results = asyncio.run(run())
+
+    assert elapsed < 3
+    for sent in results:
+        assert sent[0]['status'] == 200
+        assert json.loads(sent[1]['body']) == {'bot_response': 'ok'}
@@ -0,0 +1,151 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.chat_history import ChatHistoryStore, ChatTurn
+
+
+def make_store(tmp_path, **kwargs):
+    kwargs.setdefault('window', 3)
+    kwargs.setdefault('max_turns', 20)
+    kwargs.setdefault('prune_interval', 3600)
+    return ChatHistoryStore(directory=str(tmp_path), **kwargs)
+
+
+def page_turns(page):
+    return [turn['turn'] for turn in page['turns']]
+
+
+def test_long_turns_are_compressed_in_memory():
+    turn = ChatTurn(0, 0.0, 'short question', 'answer ' * 200, compress_min=512)
+
+    assert turn.user == 'short question'
+    assert isinstance(turn._bot, bytes)
+    assert turn.bot == 'answer ' * 200
+
+
+def test_append_keeps_a_window_of_recent_turns(tmp_path):
+    store = make_store(tmp_path)
+    for n in range(5):
+        store.append('doc1', f"question {n}", f"answer {n}")
+
+    assert [turn.turn for turn in store.recent('doc1')] == [2, 3, 4]
+    assert [turn.user for turn in store.recent('doc1', 2)] == ['question 3', 'question 4']
+    assert store.recent('doc1', 0) == []
+    assert store.recent('other') == []
+
+
+def test_history_reloads_from_the_log(tmp_path):
+    store = make_store(tmp_path)
+    for n in range(4):
+        store.append('doc1', f"question {n}", f"answer {n}")
+
+    reloaded = make_store(tmp_path)
+    assert [turn.bot for turn in reloaded.recent('doc1')] == ['answer 1', 'answer 2', 'answer 3']
+    assert reloaded.append('doc1', 'next', 'reply').turn == 4
+
+
+def test_compaction_keeps_the_newest_turns(tmp_path):
+    store = make_store(tmp_path, max_turns=10)
+    for n in range(25):
+        store.append('doc1', f"question {n}", f"answer {n}")
+
+    with open(tmp_path / 'doc1.jsonl') as log:
+        turns = [json.loads(line)['turn'] for line in log]
+    assert len(turns) <= 11
+    assert turns[-1] == 24
+    assert turns == sorted(turns)
+
+
+def test_page_walks_back_to_the_oldest_turn(tmp_path):
+    store = make_store(tmp_path)
+    for n in range(7):
+        store.append('doc1', f"question {n}", f"answer {n}")
+
+    first = store.page('doc1', limit=3)
+    assert page_turns(first) == [6, 5, 4]
+    assert first['next_before'] == 4
+
+    second = store.page('doc1', before=first['next_before'], limit=3)
+    assert page_turns(second) == [3, 2, 1]
+
+    last = store.page('doc1', before=second['next_before'], limit=3)
+    assert page_turns(last) == [0]
+    assert last['next_before'] is None
+
+    exact = store.page('doc1', before=3, limit=3)
+    assert page_turns(exact) == [2, 1, 0]
+    assert exact['next_before'] is None
+
+
+def test_page_ends_after_compaction_dropped_early_turns(tmp_path):
+    store = make_store(tmp_path, max_turns=10)
+    for n in range(25):
+        store.append('doc1', f"question {n}", 'answer ' * n)
+
+    pages = []
+    before = None
+    while True:
+        page = store.page('doc1', before=before, limit=4)
+        pages.append(page_turns(page))
+        before = page['next_before']
+        if before is None:
+            break
+
+    turns = [turn for page in pages for turn in page]
+    assert turns[0] == 24
+    assert turns == sorted(turns, reverse=True)
+    assert pages[-1] and turns[-1] > 0
+
+
+def test_reverse_reads_across_small_blocks(tmp_path):
+    store = make_store(tmp_path)
+    for n in range(6):
+        store.append('doc1', f"question {n}", f"answer {n}")
+
+    records = list(store._read_records_reversed('doc1', block_size=7))
+    assert [record['turn'] for record in records] == [5, 4, 3, 2, 1, 0]
+
+
+def test_torn_and_corrupt_lines_are_skipped(tmp_path):
+    store = make_store(tmp_path)
+    for n in range(3):
+        store.append('doc1', f"question {n}", f"answer {n}")
+    with open(tmp_path / 'doc1.jsonl', 'a') as log:
+        log.write('not json\n{"turn": 3, "user": "cut off mid-wri')
+
+    # A new process picks up the log and appends after the torn line
+    reloaded = make_store(tmp_path)
+    assert [turn.turn for turn in reloaded.recent('doc1')] == [0, 1, 2]
+    reloaded.append('doc1', 'after the crash', 'still works')
+
+    again = make_store(tmp_path)
+    assert [turn.user for turn in again.recent('doc1')] == ['question 1', 'question 2', 'after the crash']
+    assert page_turns(again.page('doc1', limit=10)) == [3, 2, 1, 0]
+
+
+def test_invalid_conversation_ids_are_rejected(tmp_path):
+    store = make_store(tmp_path)
+
+    with pytest.raises(ValueError):
+        store.append('../escape', 'question', 'answer')
+
+
+def test_prune_drops_idle_conversations_and_old_logs(tmp_path):
+    store = make_store(tmp_path, idle_seconds=1, max_age_days=1)
+    store.append('old', 'question', 'answer')
+    store.append('new', 'question', 'answer')
+    old_time = os.path.getmtime(tmp_path / 'old.jsonl') - 2 * 86400
+    os.utime(tmp_path / 'old.jsonl', (old_time, old_time))
+    for state in store._conversations.values():
+        state['last_used'] -= 10
+
+    store.prune()
+
+    assert store._conversations == {}
+    assert not (tmp_path / 'old.jsonl').exists()
+    assert [turn.user for turn in store.recent('new')] == ['question']
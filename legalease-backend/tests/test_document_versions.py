@@ -0,0 +1,117 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.document_versions import (
+    split_clauses, diff_clauses, compare_versions, batch_changes_for_prompt
+)
+
+# Shaped like PyPDF2 output: no blank lines, a running header and a page label at each break
+PDF_TEXT = """SERVICE AGREEMENT
+1. SERVICES
+The Service Provider agrees to perform the services in a professional and
+workmanlike manner.
+2. COMPENSATION
+The Client shall pay the fee within
+30
+days of receipt of an invoice.
+Page 1
+SERVICE AGREEMENT
+3. TERM AND TERMINATION
+Either party may terminate this Agreement on written notice, and the
+obligations in Section 2 survive termination.
+Page 2
+SERVICE AGREEMENT
+4. GOVERNING LAW
+This Agreement is governed by the laws of the State of Delaware.
+Page 3"""
+
+
+def test_split_clauses_groups_pdf_lines_by_clause():
+    clauses = split_clauses(PDF_TEXT)
+
+    assert clauses == [
+        '1. SERVICES The Service Provider agrees to perform the services in a professional and workmanlike manner.',
+        '2. COMPENSATION The Client shall pay the fee within 30 days of receipt of an invoice.',
+        '3. TERM AND TERMINATION Either party may terminate this Agreement on written notice, '
+        'and the obligations in Section 2 survive termination.',
+        '4. GOVERNING LAW This Agreement is governed by the laws of the State of Delaware.'
+    ]
+
+
+def test_split_clauses_strips_page_numbers_next_to_headers_and_in_sequence():
+    next_to_header = "ACME MSA\n1\n1. Scope\nServices.\nACME MSA\n2\n2. Fees\nFixed.\nACME MSA\n3\n3. Term\nOne year."
+    in_sequence = "1. Scope\nServices.\n1\n2. Fees\nFixed.\n2\n3. Term\nOne year.\n3"
+
+    expected = ['1. Scope Services.', '2. Fees Fixed.', '3. Term One year.']
+    assert split_clauses(next_to_header) == expected
+    assert split_clauses(in_sequence) == expected
+
+
+def test_split_clauses_falls_back_to_blank_lines_then_lines():
+    assert split_clauses("First paragraph\nwraps here.\n\nSecond paragraph.") == [
+        'First paragraph wraps here.', 'Second paragraph.'
+    ]
+    assert split_clauses("one line\nanother line") == ['one line', 'another line']
+    assert split_clauses('') == []
+
+
+def test_wrapped_number_change_is_a_modified_clause():
+    changes, summary = compare_versions(PDF_TEXT, PDF_TEXT.replace('\n30\n', '\n60\n'))
+
+    assert changes == [{
+        'type': 'modified',
+        'old': ['2. COMPENSATION The Client shall pay the fee within 30 days of receipt of an invoice.'],
+        'new': ['2. COMPENSATION The Client shall pay the fee within 60 days of receipt of an invoice.'],
+        'position': 1
+    }]
+    assert summary['modified'] == 1
+    assert summary['clauses_before'] == summary['clauses_after'] == 4
+    assert not summary['unchanged']
+
+
+def test_diff_clauses_reports_added_and_removed_clauses():
+    changes = diff_clauses(['a', 'b', 'c'], ['a', 'c', 'd'])
+
+    assert changes == [
+        {'type': 'removed', 'old': ['b'], 'new': [], 'position': 1},
+        {'type': 'added', 'old': [], 'new': ['d'], 'position': 2}
+    ]
+    assert diff_clauses(['a'], ['a']) == []
+
+
+def test_batches_split_a_large_replace_block_by_clause():
+    old = [f"Clause {n} old wording " + 'x' * 80 for n in range(40)]
+    new = [f"Clause {n} new wording " + 'y' * 80 for n in range(40)]
+    changes = diff_clauses(old, new)
+    assert len(changes) == 1
+
+    batches, left_out = batch_changes_for_prompt(changes, batch_chars=500, max_batches=100)
+
+    assert left_out == 0
+    assert all(len(batch) <= 500 for batch in batches)
+    text = '\n'.join(batches)
+    for n in range(40):
+        assert f"BEFORE: Clause {n} old wording" in text
+        assert f"AFTER: Clause {n} new wording" in text
+
+
+def test_batches_count_clause_changes_left_out():
+    changes = [{'type': 'added', 'old': [], 'new': [f"clause {n} " + 'z' * 90], 'position': n} for n in range(10)]
+
+    batches, left_out = batch_changes_for_prompt(changes, batch_chars=250, max_batches=2)
+
+    # Two 100-character clauses fit per batch
+    assert len(batches) == 2
+    assert left_out == 6
+    assert batches[0].startswith('ADDED: clause 0')
+
+
+def test_single_oversized_clause_is_cut_to_the_batch_size():
+    changes = [{'type': 'removed', 'old': ['w' * 1000], 'new': [], 'position': 0}]
+
+    batches, left_out = batch_changes_for_prompt(changes, batch_chars=300)
+
+    assert batches == [('REMOVED: ' + 'w' * 1000)[:300]]
+    assert left_out == 0
@@ -0,0 +1,83 @@
+import asyncio
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.extraction import _JobSlots
+
+
+def test_cancelled_waiters_do_not_keep_a_slot():
+    slots = _JobSlots(1)
+
+    async def scenario():
+        await slots.acquire()
+        waiters = [asyncio.create_task(slots.acquire()) for _ in range(5)]
+        await asyncio.sleep(0)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+
+        slots.release()
+        # The slot is free again, not handed to a cancelled waiter
+        await asyncio.wait_for(slots.acquire(), timeout=1)
+        slots.release()
+
+    asyncio.run(scenario())
+    assert slots._free == 1 and not slots._waiters
+
+
+def test_timed_out_waiter_passes_the_slot_on():
+    slots = _JobSlots(1)
+
+    async def scenario():
+        await slots.acquire()
+        impatient = asyncio.create_task(asyncio.wait_for(slots.acquire(), timeout=0.05))
+        patient = asyncio.create_task(slots.acquire())
+        await asyncio.sleep(0.1)
+        assert impatient.done() and isinstance(impatient.exception(), asyncio.TimeoutError)
+
+        slots.release()
+        await asyncio.wait_for(patient, timeout=1)
+        slots.release()
+
+    asyncio.run(scenario())
+    assert slots._free == 1
+
+
+def test_slots_are_shared_across_event_loops():
+    # Under WSGI each request runs its async view on its own event loop
+    slots = _JobSlots(1)
+    held = threading.Event()
+    release = threading.Event()
+    acquired = []
+
+    def holder():
+        async def run():
+            await slots.acquire()
+            held.set()
+            await asyncio.get_running_loop().run_in_executor(None, release.wait)
+            slots.release()
+        asyncio.run(run())
+
+    def waiter():
+        async def run():
+            await slots.acquire()
+            acquired.append(True)
+            slots.release()
+        asyncio.run(run())
+
+    first = threading.Thread(target=holder)
+    first.start()
+    assert held.wait(1)
+    second = threading.Thread(target=waiter)
+    second.start()
+    second.join(0.2)
+    assert acquired == []
+
+    release.set()
+    first.join(1)
+    second.join(1)
+    assert acquired == [True]
+    assert slots._free == 1
@@ -0,0 +1,66 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.asgi import asgi_app
+from src.main import app
+import src.routes.legal as legal
+from test_asgi_concurrency import call_chat_general
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class LoopBoundModel:
+    """Mimics genai: the async client is tied to the first event loop it runs on"""
+
+    def __init__(self):
+        self.loop = None
+        self.sync_calls = 0
+        self.async_calls = 0
+
+    def generate_content(self, prompt):
+        self.sync_calls += 1
+        return FakeResponse('sync answer')
+
+    async def generate_content_async(self, prompt):
+        loop = asyncio.get_running_loop()
+        if self.loop is None:
+            self.loop = loop
+        elif self.loop is not loop:
+            raise RuntimeError('Event loop is closed')
+        self.async_calls += 1
+        return FakeResponse('async answer')
+
+
+def test_wsgi_requests_use_the_sync_client(monkeypatch):
+    fake = LoopBoundModel()
+    monkeypatch.setattr(legal, 'model', fake)
+    client = app.test_client()
+
+    for _ in range(2):
+        response = client.post('/api/chat/general', json={'message': 'What is an NDA?'})
+        assert response.status_code == 200
+        assert response.get_json() == {'bot_response': 'sync answer'}
+
+    assert fake.sync_calls == 2
+    assert fake.async_calls == 0
+
+
+def test_asgi_requests_use_the_async_client(monkeypatch):
+    fake = LoopBoundModel()
+    monkeypatch.setattr(legal, 'model', fake)
+
+    async def run():
+        return [await call_chat_general('What is an NDA?') for _ in range(2)]
+
+    for sent in asyncio.run(run()):
+        assert sent[0]['status'] == 200
+        assert b'async answer' in sent[1]['body']
+
+    assert fake.async_calls == 2
+    assert fake.sync_calls == 0
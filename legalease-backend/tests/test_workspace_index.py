@@ -0,0 +1,108 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.workspace_index import WorkspaceIndex, chunk_text, tokenize
+
+MSA = """1. SERVICES
+The Supplier shall provide hosting services described in each statement of work.
+2. LIABILITY
+The Supplier's aggregate liability is capped at the fees paid in the prior twelve months.
+3. CONFIDENTIALITY
+Each party shall protect the other party's confidential information."""
+
+SOW = """1. SCOPE
+Migration of the Customer's billing database to the hosted platform.
+2. FEES
+Fees are payable monthly in arrears."""
+
+
+def build_index():
+    index = WorkspaceIndex()
+    index.add_document('msa', 'msa.pdf', MSA)
+    index.add_document('sow', 'sow.pdf', SOW)
+    return index
+
+
+def assert_consistent(index):
+    """Postings, chunks and totals must agree after every update"""
+    for term, term_postings in index.postings.items():
+        assert term_postings, term
+        for key in term_postings:
+            assert key in index.chunks
+    assert index.total_length == sum(length for _, length in index.chunks.values())
+    assert {document_id for document_id, _ in index.chunks} == set(index.documents)
+
+
+def test_tokenize_drops_stop_words():
+    assert tokenize("The Supplier shall provide hosting") == ['supplier', 'provide', 'hosting']
+
+
+def test_chunk_text_keeps_chunks_within_size():
+    chunks = chunk_text(MSA * 5, chunk_size=200)
+
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 200 for chunk in chunks)
+
+
+def test_search_ranks_matching_chunks_across_documents():
+    index = build_index()
+
+    results = index.search('liability cap')
+    assert results[0]['document_id'] == 'msa'
+    assert results[0]['file_name'] == 'msa.pdf'
+    assert 'liability' in results[0]['text']
+
+    results = index.search('billing database migration')
+    assert results[0]['document_id'] == 'sow'
+    assert index.search('unrelated') == []
+    assert_consistent(index)
+
+
+def test_search_respects_limit_and_char_budget():
+    index = WorkspaceIndex()
+    for n in range(6):
+        index.add_document(f"doc{n}", f"doc{n}.pdf", f"Indemnity clause number {n}. " + 'indemnity terms ' * 30)
+
+    assert len(index.search('indemnity', limit=3)) == 3
+
+    results = index.search('indemnity', char_budget=700)
+    assert sum(len(result['text']) for result in results) <= 700
+    assert len(results) < 6
+
+
+def test_replace_document_swaps_ids_and_content():
+    index = build_index()
+
+    index.replace_document('msa', 'msa-v2', 'msa-v2.pdf', MSA.replace('twelve months', 'six months').replace('hosting', 'colocation'))
+
+    assert index.document_ids() == ['sow', 'msa-v2']
+    assert index.search('hosting') == []
+    assert index.search('colocation')[0]['document_id'] == 'msa-v2'
+    assert_consistent(index)
+
+
+def test_remove_document_drops_its_postings():
+    index = build_index()
+
+    assert index.remove_document('msa')
+    assert not index.remove_document('msa')
+
+    assert index.list_documents() == [{'document_id': 'sow', 'file_name': 'sow.pdf'}]
+    assert index.search('liability') == []
+    assert 'liability' not in index.postings
+    assert_consistent(index)
+
+    index.remove_document('sow')
+    assert index.postings == {} and index.chunks == {} and index.total_length == 0
+    assert index.search('fees') == []
+
+
+def test_re_adding_a_document_replaces_it():
+    index = build_index()
+    index.add_document('sow', 'sow.pdf', "1. FEES\nFees are payable quarterly.\n2. TERM\nTwo years.")
+
+    assert index.search('migration') == []
+    assert index.search('quarterly')[0]['document_id'] == 'sow'
+    assert_consistent(index)